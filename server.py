@@ -15,17 +15,225 @@ This server implements a full-featured HTTP/1.1 server with:
 """
 
 import socket
+import selectors
 import threading
 import sys
 import os
 import json
+import signal
 import time
 from datetime import datetime
-from pathlib import Path
-from queue import Queue
-from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from collections import deque, OrderedDict
 import hashlib
+import itertools
 import re
+import stat
+from urllib.parse import quote
+import logging
+import logging.handlers
+import queue
+
+
+# Header names the server looks up, as the lower-cased bytes keys produced
+# by HTTPServer.parse_request()
+HEADER_HOST = b'host'
+HEADER_CONNECTION = b'connection'
+HEADER_CONTENT_TYPE = b'content-type'
+HEADER_CONTENT_LENGTH = b'content-length'
+
+# Parsed names are mapped onto the constants above, so lookups compare by
+# identity instead of hashing and comparing a fresh bytes object
+KNOWN_HEADERS = {
+    name: name
+    for name in (HEADER_HOST, HEADER_CONNECTION, HEADER_CONTENT_TYPE, HEADER_CONTENT_LENGTH)
+}
+
+# Returned by HTTPServer.parse_request() while the request has not fully arrived
+INCOMPLETE_REQUEST = object()
+
+
+def error_page(status_code, message):
+    """
+    Render the HTML body of an error response.
+    
+    Args:
+        status_code (int): HTTP status code
+        message (str): Error message
+        
+    Returns:
+        bytes: UTF-8 encoded HTML page
+    """
+    return f"""<!DOCTYPE html>
+<html>
+<head><title>{status_code} {message}</title></head>
+<body>
+<h1>{status_code} {message}</h1>
+<p>The server encountered an error processing your request.</p>
+</body>
+</html>""".encode('utf-8')
+
+
+class Connection:
+    """
+    State kept for a client connection while it waits between requests.
+    
+    Attributes:
+        sock (socket): Client socket connection
+        address (tuple): Client address (IP, port)
+        request_count (int): Number of requests served on this connection
+        wheel_slot (int): Idle-wheel bucket holding this connection while watched
+        pending (bytearray): Start of a request received but not yet
+            complete, b'' if there is none; later reads are appended to it
+        head_scanned (int): Bytes of pending already searched for the end of
+            the request head without finding it
+        request_length (int): Full length of the pending request once its
+            head has been parsed, 0 while the head is still arriving
+    """
+    
+    __slots__ = ('sock', 'address', 'request_count', 'wheel_slot', 'pending',
+                 'head_scanned', 'request_length')
+    
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.request_count = 0
+        self.wheel_slot = None
+        self.pending = b''
+        self.head_scanned = 0
+        self.request_length = 0
+
+
+class ResponseBuffer:
+    """
+    Stand-in for a client socket that collects responses instead of sending them.
+    
+    Responses to requests that arrived in the same read are written here
+    and flushed together with one gathered send, rather than one send per
+    response. sendfile() flushes first so responses stay in order.
+    
+    Attributes:
+        sock (socket): Client socket the responses are for
+        buffers (list): bytes-like objects waiting to be sent, in order
+        flush_buffers (callable): Sends a list of buffers to a socket
+    """
+    
+    __slots__ = ('sock', 'buffers', 'flush_buffers')
+    
+    def __init__(self, sock, flush_buffers):
+        self.sock = sock
+        self.buffers = []
+        self.flush_buffers = flush_buffers
+    
+    def sendall(self, data):
+        """
+        Collect data to be sent with the next flush.
+        
+        Args:
+            data (bytes-like): Data to send
+        """
+        self.buffers.append(data)
+    
+    def sendmsg(self, buffers):
+        """
+        Collect several buffers to be sent with the next flush.
+        
+        Args:
+            buffers (list): bytes-like objects to send in order
+            
+        Returns:
+            int: Total length of the buffers, as if all were sent
+        """
+        self.buffers.extend(buffers)
+        return sum(len(buffer) for buffer in buffers)
+    
+    def sendfile(self, file, offset=0, count=None):
+        """
+        Flush the collected data, then send a file straight to the socket.
+        
+        Args:
+            file (file): File opened in binary mode
+            offset (int): Position in the file to start from
+            count (int): Number of bytes to send, None for up to end of file
+            
+        Returns:
+            int: Number of bytes sent
+        """
+        self.flush()
+        return self.sock.sendfile(file, offset, count)
+    
+    def flush(self):
+        """
+        Send everything collected so far.
+        """
+        if self.buffers:
+            buffers, self.buffers = self.buffers, []
+            self.flush_buffers(self.sock, buffers)
+
+
+class WorkerShard:
+    """
+    A slice of the worker pool: long-lived threads fed from their own queue.
+    
+    Attributes:
+        size (int): Number of worker threads in this shard
+        workers (list): Worker threads, created by start()
+        connection_queue (deque): Connections waiting for a worker
+        ready (Semaphore): Number of queued connections; each release wakes one worker
+        idle_workers (int): Workers not currently serving a connection
+        idle_lock (Lock): Guards idle_workers, which every worker updates
+    """
+    
+    __slots__ = ('size', 'workers', 'connection_queue', 'ready', 'idle_workers', 'idle_lock')
+    
+    def __init__(self, size):
+        self.size = size
+        self.workers = []
+        self.connection_queue = deque()
+        self.ready = threading.Semaphore(0)
+        self.idle_workers = size
+        self.idle_lock = threading.Lock()
+    
+    def has_free_worker(self):
+        """
+        Check whether a connection submitted now would be picked up at once.
+        
+        Returns:
+            bool: True if more workers are idle than connections are queued
+        """
+        return self.idle_workers > len(self.connection_queue)
+    
+    def start(self, target, name):
+        """
+        Start the shard's worker threads.
+        
+        Args:
+            target (callable): Worker loop, called with this shard
+            name (str): Prefix for the worker thread names
+        """
+        for i in range(self.size):
+            worker = threading.Thread(target=target, args=(self,), name=f"{name}_{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+    
+    def submit(self, connection):
+        """
+        Queue a connection and wake one worker for it.
+        
+        Args:
+            connection (Connection or None): Connection to serve, or None to stop a worker
+        """
+        self.connection_queue.append(connection)
+        self.ready.release()
+    
+    def stop(self):
+        """
+        Stop the worker threads once they finish their current connection.
+        """
+        for _ in self.workers:
+            self.submit(None)
+        for worker in self.workers:
+            worker.join()
 
 
 class HTTPServer:
@@ -35,13 +243,16 @@ class HTTPServer:
     Attributes:
         host (str): Server host address
         port (int): Server port number
-        max_threads (int): Maximum number of worker threads
+        max_threads (int): Maximum number of worker threads per process
+        processes (int): Number of server processes sharing the port
+        backlog (int): Listen queue length
+        sndbuf (int): SO_SNDBUF size in bytes, None for the kernel default
+        rcvbuf (int): SO_RCVBUF size in bytes, None for the kernel default
         resources_dir (str): Directory containing servable files
-        thread_pool (ThreadPoolExecutor): Pool of worker threads
+        valid_hosts (frozenset): Accepted Host header values as bytes
+        shards (list): Worker threads split into WorkerShard instances
         server_socket (socket): Main server socket
-        connection_queue (Queue): Queue for pending connections
-        active_threads (int): Count of currently active threads
-        lock (Lock): Thread lock for synchronization
+        selector (BaseSelector): Watches the listener and idle keep-alive connections
     """
     
     # HTTP Status codes
@@ -57,260 +268,813 @@ class HTTPServer:
         503: "Service Unavailable"
     }
     
-    # Supported file types and their content types
+    # Complete status lines, encoded once at class creation
+    STATUS_LINES = {
+        code: f"HTTP/1.1 {code} {text}\r\n".encode('ascii')
+        for code, text in STATUS_CODES.items()
+    }
+    
+    # Error pages and their Content-Length values, rendered once per status
+    ERROR_BODIES = {code: error_page(code, text) for code, text in STATUS_CODES.items()}
+    ERROR_LENGTHS = {code: str(len(body)) for code, body in ERROR_BODIES.items()}
+    
+    # Request line followed by complete header lines and the blank line
+    REQUEST_PATTERN = re.compile(rb'(\S+) (\S+) (\S+)\r\n((?:[^\r\n]+\r\n)*)\r\n')
+    
+    # Blank line ending the request head
+    HEAD_END_PATTERN = re.compile(rb'\r\n\r\n')
+    
+    # Supported file types: (content type, sent as a download attachment)
     CONTENT_TYPES = {
-        '.html': 'text/html; charset=utf-8',
-        '.txt': 'application/octet-stream',
-        '.png': 'application/octet-stream',
-        '.jpg': 'application/octet-stream',
-        '.jpeg': 'application/octet-stream'
+        '.html': ('text/html; charset=utf-8', False),
+        '.txt': ('application/octet-stream', True),
+        '.png': ('application/octet-stream', True),
+        '.jpg': ('application/octet-stream', True),
+        '.jpeg': ('application/octet-stream', True)
     }
     
-    def __init__(self, host="127.0.0.1", port=8080, max_threads=10):
+    # Connection persistence limits
+    KEEP_ALIVE_TIMEOUT = 30
+    MAX_REQUESTS = 100
+    
+    # Header lines that are identical on every response, pre-encoded
+    SERVER_HEADER = b'Server: Multi-threaded HTTP Server\r\n'
+    KEEP_ALIVE_HEADERS = (
+        f"Connection: keep-alive\r\n"
+        f"Keep-Alive: timeout={KEEP_ALIVE_TIMEOUT}, max={MAX_REQUESTS}\r\n"
+    ).encode('ascii')
+    CLOSE_HEADERS = b'Connection: close\r\n'
+    
+    # Characters that may not appear in a quoted filename= parameter: quotes,
+    # backslashes and ASCII control characters (a CR or LF would end the header)
+    FILENAME_UNSAFE = str.maketrans(dict.fromkeys('"\\\x7f' + ''.join(map(chr, range(32))), '_'))
+    
+    # Connections a shard may have queued per worker before new requests
+    # are refused with 503 instead of waiting
+    QUEUE_DEPTH = 16
+    
+    # Size of each worker thread's receive buffer
+    RECV_BUFFER_SIZE = 65536
+    
+    # Largest request (head plus body) the server will buffer
+    MAX_REQUEST_SIZE = 65536
+    
+    # Largest request line plus headers, checked separately from the body
+    MAX_HEAD_SIZE = 8192
+    
+    # In-memory cache of small static files: total bytes held, and the
+    # largest file cached (bigger files are always sent with sendfile())
+    FILE_CACHE_SIZE = 16 * 1024 * 1024
+    FILE_CACHE_MAX_FILE = 256 * 1024
+    
+    # Bodies up to this size are copied into one buffer with the headers
+    COALESCE_LIMIT = 16384
+    
+    # Most buffers sendmsg() takes in one call (IOV_MAX on Linux)
+    SENDMSG_MAX_BUFFERS = 1024
+    
+    def __init__(self, host="127.0.0.1", port=8080, max_threads=10, processes=1,
+                 backlog=socket.SOMAXCONN, sndbuf=None, rcvbuf=None):
         """
         Initialize the HTTP server with configuration parameters.
         
         Args:
             host (str): Host address to bind to
             port (int): Port number to listen on
-            max_threads (int): Maximum number of worker threads
+            max_threads (int): Maximum number of worker threads per process
+            processes (int): Number of server processes sharing the port;
+                0 starts one per CPU (Linux only, elsewhere always 1)
+            backlog (int): Listen queue length (capped by the kernel's
+                net.core.somaxconn)
+            sndbuf (int): Socket send buffer size in bytes; None keeps the
+                kernel default, which auto-tunes on Linux
+            rcvbuf (int): Socket receive buffer size in bytes; None keeps
+                the kernel default
         """
         self.host = host
         self.port = port
         self.max_threads = max_threads
+        if processes == 0:
+            processes = os.cpu_count() or 1
+        self.processes = max(1, processes)
+        self.backlog = backlog
+        self.sndbuf = sndbuf
+        self.rcvbuf = rcvbuf
         self.resources_dir = 'resources'
+        
+        # Resolved resources directory, used by validate_path() for the
+        # containment check; the trailing separator keeps siblings such as
+        # "resources_old" from matching by prefix
+        self.resources_root = os.path.realpath(self.resources_dir) + os.sep
+        
+        # Valid Host header values, built once for validate_host()
+        valid_hosts = [
+            f"{host}:{port}",
+            f"localhost:{port}",
+            f"127.0.0.1:{port}"
+        ]
+        
+        # Also accept without port if using default port 80
+        if port == 80:
+            valid_hosts.extend([host, "localhost", "127.0.0.1"])
+        
+        self.valid_hosts = frozenset(h.encode('latin-1') for h in valid_hosts)
         self.uploads_dir = os.path.join(self.resources_dir, 'uploads')
         
-        # Thread pool and connection management
-        self.thread_pool = ThreadPoolExecutor(max_workers=max_threads)
-        self.connection_queue = Queue()
-        self.active_threads = 0
-        self.lock = threading.Lock()
+        # Thread pool and connection management, split into one shard per
+        # CPU so each queue is only contended by its own threads
+        shard_count = max(1, min(os.cpu_count() or 1, max_threads))
+        self.shards = [
+            WorkerShard(max_threads // shard_count + (1 if i < max_threads % shard_count else 0))
+            for i in range(shard_count)
+        ]
+        self.shard_cycle = itertools.cycle(range(shard_count))
         
         # Create uploads directory if it doesn't exist
         os.makedirs(self.uploads_dir, exist_ok=True)
         
-        # Server socket (initialized in start())
+        # Server socket and selector (initialized in start())
         self.server_socket = None
+        self.selector = None
+        
+        # Keep-alive connections handed back by workers, registered by the
+        # selector loop once it is woken through the wake socket pair
+        self.parked = deque()
+        self.wake_reader = None
+        self.wake_writer = None
+        
+        # Timing wheel for the keep-alive idle timeout: one bucket of watched
+        # connections per second, the bucket the wheel rotates into expires
+        self.idle_wheel = [set() for _ in range(self.KEEP_ALIVE_TIMEOUT + 1)]
+        self.wheel_position = 0
+        self.wheel_tick = 0
+        
+        # Per-thread state, holding each worker's receive buffer
+        self.thread_state = threading.local()
         
-    def log(self, message, thread_id=None):
+        # Least recently used cache of small files, keyed by resolved path:
+        # (mtime_ns, size, close_head, keep_alive_head, body) entries
+        self.file_cache = OrderedDict()
+        self.file_cache_bytes = 0
+        self.file_cache_lock = threading.Lock()
+        
+        # (second, formatted) pair reused by the Date header within the
+        # same second
+        self.http_date = (0, '')
+        
+        # Server logger; INFO unless the embedding application set a level.
+        # Records are written by a listener thread started in serve()
+        self.logger = logging.getLogger('http_server')
+        if self.logger.level == logging.NOTSET:
+            self.logger.setLevel(logging.INFO)
+        self.log_handler = None
+        self.log_listener = None
+        self.log_propagate = True
+    
+    def start_logging(self):
         """
-        Log a message with timestamp and optional thread ID.
+        Route log records through a queue to a background writer thread.
         
-        Args:
-            message (str): Message to log
-            thread_id (str, optional): Thread identifier for thread-specific logs
+        Worker threads only enqueue records, so they never block on stdout.
+        Started from serve() so every forked process runs its own listener.
+        If the embedding application already handles the logger's records
+        (on it or an ancestor), they are left to those handlers.
         """
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        if thread_id:
-            print(f"[{timestamp}] [{thread_id}] {message}")
-        else:
-            print(f"[{timestamp}] {message}")
+        if self.logger.hasHandlers():
+            return
+        
+        log_queue = queue.SimpleQueue()
+        
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(logging.Formatter('[%(asctime)s] %(message)s', '%Y-%m-%d %H:%M:%S'))
+        
+        self.log_handler = logging.handlers.QueueHandler(log_queue)
+        self.log_listener = logging.handlers.QueueListener(log_queue, stream_handler)
+        self.logger.addHandler(self.log_handler)
+        self.log_propagate = self.logger.propagate
+        self.logger.propagate = False
+        self.log_listener.start()
+    
+    def stop_logging(self):
+        """
+        Flush queued log records, detach the queue handler and restore propagation.
+        """
+        if self.log_listener:
+            self.log_listener.stop()
+            self.logger.removeHandler(self.log_handler)
+            self.logger.propagate = self.log_propagate
+            self.log_listener = None
     
     def start(self):
         """
-        Start the HTTP server, bind to address, and begin accepting connections.
+        Start the HTTP server, forking extra processes when configured.
+        
+        Each process binds its own SO_REUSEPORT listener and runs its own
+        selector loop and thread pool, so the kernel spreads new connections
+        across processes and each one has its own GIL. Only Linux balances
+        connections across SO_REUSEPORT listeners; elsewhere one process
+        would get them all, so other platforms run a single process.
         """
+        if self.processes > 1 and not sys.platform.startswith('linux'):
+            self.logger.warning("Multiple processes not supported on this platform, using one")
+            self.processes = 1
+        
+        children = []
+        for _ in range(self.processes - 1):
+            pid = os.fork()
+            if pid == 0:
+                # Child process serves until shutdown and never returns
+                try:
+                    self.serve()
+                finally:
+                    os._exit(0)
+            children.append(pid)
+        
+        if children:
+            # Take the children down with the parent on SIGTERM; Ctrl+C
+            # already reaches the whole process group
+            def terminate(signum, frame):
+                for pid in children:
+                    os.kill(pid, signal.SIGTERM)
+                raise KeyboardInterrupt
+            
+            signal.signal(signal.SIGTERM, terminate)
+        
+        try:
+            self.serve()
+        finally:
+            for pid in children:
+                try:
+                    os.waitpid(pid, 0)
+                except ChildProcessError:
+                    pass
+    
+    def serve(self):
+        """
+        Bind to address and begin accepting connections in this process.
+        
+        A single selector loop accepts new connections and watches idle
+        keep-alive connections; a connection is only handed to the thread
+        pool once it has request data to read, so idle clients do not hold
+        a worker thread.
+        """
+        self.start_logging()
+        
         try:
             # Create TCP socket
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             
+            # Let every server process bind its own listener on the same port
+            if self.processes > 1:
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            
+            # Buffer sizes are set before listen() so accepted sockets inherit
+            # them and the receive window scale is negotiated to match
+            if self.sndbuf:
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+            if self.rcvbuf:
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+            
             # Bind to address and port
             self.server_socket.bind((self.host, self.port))
             
-            # Listen for connections (queue size of 50)
-            self.server_socket.listen(50)
+            # Listen for connections (kernel maximum queue size by default,
+            # so bursts of clients are not refused)
+            self.server_socket.listen(self.backlog)
+            self.server_socket.setblocking(False)
+            
+            # Selector (epoll on Linux) for the listener and idle connections
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(self.server_socket, selectors.EVENT_READ)
+            
+            self.wake_reader, self.wake_writer = socket.socketpair()
+            self.wake_reader.setblocking(False)
+            self.wake_writer.setblocking(False)
+            self.selector.register(self.wake_reader, selectors.EVENT_READ)
+            
+            # Start the worker threads (after any fork, in the serving process)
+            for index, shard in enumerate(self.shards):
+                shard.start(self.worker_loop, f"Worker-{index}")
             
             # Log server startup
-            self.log(f"HTTP Server started on http://{self.host}:{self.port}")
-            self.log(f"Thread pool size: {self.max_threads}")
-            self.log(f"Serving files from '{self.resources_dir}' directory")
-            self.log("Press Ctrl+C to stop the server")
+            self.logger.info("HTTP Server started on http://%s:%s", self.host, self.port)
+            self.logger.info("Thread pool size: %s (%s shards)", self.max_threads, len(self.shards))
+            if self.processes > 1:
+                self.logger.info("Process %s of %s sharing the port", os.getpid(), self.processes)
+            self.logger.info("Serving files from '%s' directory", self.resources_dir)
+            self.logger.info("Press Ctrl+C to stop the server")
             
-            # Accept connections in a loop
+            # Dispatch ready connections in a loop
+            self.wheel_tick = time.monotonic()
             while True:
                 try:
-                    client_socket, client_address = self.server_socket.accept()
-                    
-                    # Check thread pool status
-                    with self.lock:
-                        if self.active_threads < self.max_threads:
-                            self.active_threads += 1
-                            # Submit to thread pool
-                            self.thread_pool.submit(
-                                self.handle_client_wrapper, 
-                                client_socket, 
-                                client_address
-                            )
+                    for key, _ in self.selector.select(timeout=1):
+                        if key.fileobj is self.server_socket:
+                            self.accept_connections()
+                        elif key.fileobj is self.wake_reader:
+                            self.register_parked()
                         else:
-                            # Thread pool saturated, queue the connection
-                            self.log("Warning: Thread pool saturated, queuing connection")
-                            self.connection_queue.put((client_socket, client_address))
+                            # Request data arrived, hand the connection to a worker
+                            self.unwatch_connection(key.data)
+                            self.dispatch(key.data)
+                    
+                    self.close_idle_connections()
                             
                 except KeyboardInterrupt:
-                    self.log("Server shutting down...")
+                    self.logger.info("Server shutting down...")
                     break
                 except Exception as e:
-                    self.log(f"Error accepting connection: {e}")
+                    self.logger.error("Error accepting connection: %s", e)
                     
         except Exception as e:
-            self.log(f"Fatal error starting server: {e}")
+            self.logger.error("Fatal error starting server: %s", e)
         finally:
             if self.server_socket:
                 self.server_socket.close()
-            self.thread_pool.shutdown(wait=True)
+            for shard in self.shards:
+                shard.stop()
+            if self.selector:
+                for key in list(self.selector.get_map().values()):
+                    if key.data is not None:
+                        key.data.sock.close()
+                self.selector.close()
+            while self.parked:
+                self.parked.popleft().sock.close()
+            if self.wake_reader:
+                self.wake_reader.close()
+                self.wake_writer.close()
+            self.stop_logging()
     
-    def handle_client_wrapper(self, client_socket, client_address):
+    def accept_connections(self):
+        """
+        Accept every pending connection on the listener and start watching it.
         """
-        Wrapper for handle_client that manages thread pool count and dequeuing.
+        while True:
+            try:
+                client_socket, client_address = self.server_socket.accept()
+            except BlockingIOError:
+                return
+            
+            # Timeout bounds how long a worker may block while sending
+            client_socket.settimeout(self.KEEP_ALIVE_TIMEOUT)
+            
+            self.configure_client_socket(client_socket)
+            
+            self.logger.info("Connection from %s:%s", client_address[0], client_address[1])
+            self.watch_connection(Connection(client_socket, client_address))
+    
+    def configure_client_socket(self, client_socket):
+        """
+        Apply TCP options to an accepted socket.
+        
+        Options the platform does not support are skipped.
         
         Args:
-            client_socket (socket): Client socket connection
-            client_address (tuple): Client address (IP, port)
+            client_socket (socket): Accepted client socket
         """
         try:
-            self.handle_client(client_socket, client_address)
-        finally:
-            # Decrement active threads and check queue
-            with self.lock:
-                self.active_threads -= 1
-                
-                # Check if there are queued connections
-                if not self.connection_queue.empty():
-                    queued_socket, queued_address = self.connection_queue.get()
-                    self.log(f"Connection dequeued, assigned to new thread")
-                    self.active_threads += 1
-                    self.thread_pool.submit(
-                        self.handle_client_wrapper,
-                        queued_socket,
-                        queued_address
-                    )
+            # Send small responses immediately instead of waiting on Nagle,
+            # and ACK requests without the delayed-ACK timer where supported
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if hasattr(socket, 'TCP_QUICKACK'):
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+            
+            # Detect dead peers after ~2 minutes instead of the 2-hour default
+            client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60)
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 15)
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 4)
+        except OSError as e:
+            self.logger.warning("Could not set socket options: %s", e)
     
-    def handle_client(self, client_socket, client_address):
+    def dispatch(self, connection):
         """
-        Handle a client connection, supporting persistent connections.
+        Hand a connection with pending request data to the thread pool.
         
         Args:
-            client_socket (socket): Client socket connection
-            client_address (tuple): Client address (IP, port)
+            connection (Connection): Connection ready to be served
         """
-        thread_id = threading.current_thread().name
-        self.log(f"Connection from {client_address[0]}:{client_address[1]}", thread_id)
+        # Prefer a shard with a worker free to take the connection now, in
+        # round-robin order; queue length alone cannot tell a shard whose
+        # workers are all busy from one with an idle worker. Only when every
+        # worker is busy fall back to the shortest queue.
+        first = next(self.shard_cycle)
+        candidates = [self.shards[(first + i) % len(self.shards)] for i in range(len(self.shards))]
+        shard = next(
+            (candidate for candidate in candidates if candidate.has_free_worker()),
+            None
+        )
+        if shard is None:
+            shard = min(candidates, key=lambda candidate: len(candidate.connection_queue))
+        
+        # Connections still waiting once the shard's idle workers take theirs;
+        # ones just submitted to an idle worker that has not dequeued them
+        # yet do not count
+        waiting = len(shard.connection_queue) - shard.idle_workers
+        
+        # Every shard is backed up: shed the request rather than let the
+        # queues grow without bound
+        if waiting >= shard.size * self.QUEUE_DEPTH:
+            self.logger.warning("Thread pool saturated, rejecting connection")
+            
+            # This runs on the selector thread, so nothing here may block:
+            # drain what the request sent (so closing sends FIN, not RST),
+            # then try the 503 with a single send and close regardless
+            try:
+                connection.sock.setblocking(False)
+                try:
+                    connection.sock.recv(self.RECV_BUFFER_SIZE)
+                except OSError:
+                    pass
+                response = ResponseBuffer(connection.sock, self.send_buffers_once)
+                self.send_error(response, 503, "Service Unavailable", "Dispatcher")
+                try:
+                    response.flush()
+                except OSError:
+                    pass
+            finally:
+                self.close_connection(connection, "Dispatcher")
+            return
         
-        # Set socket timeout for persistent connections
-        client_socket.settimeout(30)
+        if waiting >= 0:
+            self.logger.debug("Thread pool busy, queuing connection")
         
-        request_count = 0
-        max_requests = 100
+        shard.submit(connection)
+    
+    def park_connection(self, connection):
+        """
+        Return a keep-alive connection to the selector loop until its next request.
+        
+        Called from worker threads, so the selector itself is only touched by
+        the loop in start(); the wake socket interrupts its select() call.
         
+        Args:
+            connection (Connection): Connection to watch for the next request
+        """
+        self.parked.append(connection)
         try:
-            while request_count < max_requests:
-                try:
-                    # Receive request data
-                    request_data = client_socket.recv(8192)
-                    
-                    if not request_data:
-                        break
-                    
-                    request_count += 1
-                    
-                    # Parse the HTTP request
-                    request_text = request_data.decode('utf-8', errors='ignore')
-                    parsed_request = self.parse_request(request_text)
-                    
-                    if not parsed_request:
-                        self.send_error(client_socket, 400, "Bad Request", thread_id)
-                        break
-                    
-                    method, path, version, headers, body = parsed_request
-                    
-                    self.log(f"Request: {method} {path} {version}", thread_id)
-                    
-                    # Validate Host header
-                    if not self.validate_host(headers):
-                        if 'host' not in headers:
-                            self.log(f"Missing Host header", thread_id)
-                            self.send_error(client_socket, 400, "Bad Request", thread_id)
-                        else:
-                            self.log(f"Host validation failed: {headers.get('host', 'N/A')}", thread_id)
-                            self.send_error(client_socket, 403, "Forbidden", thread_id)
-                        break
-                    
-                    self.log(f"Host validation: {headers.get('host', 'N/A')} ✓", thread_id)
-                    
-                    # Determine connection persistence
-                    keep_alive = self.should_keep_alive(version, headers)
-                    
-                    # Route request based on method
-                    if method == "GET":
-                        self.handle_get(client_socket, path, headers, thread_id, keep_alive)
-                    elif method == "POST":
-                        self.handle_post(client_socket, path, headers, body, thread_id, keep_alive)
-                    else:
-                        self.send_error(client_socket, 405, "Method Not Allowed", thread_id, keep_alive)
-                    
-                    # Check if connection should be closed
-                    if not keep_alive:
-                        self.log(f"Connection: close", thread_id)
-                        break
-                    
-                    self.log(f"Connection: keep-alive", thread_id)
-                    
-                except socket.timeout:
-                    self.log(f"Connection timeout", thread_id)
-                    break
-                except Exception as e:
-                    self.log(f"Error handling request: {e}", thread_id)
-                    break
-                    
-        finally:
-            client_socket.close()
-            self.log(f"Connection closed", thread_id)
+            self.wake_writer.send(b'\0')
+        except (BlockingIOError, OSError):
+            # A wake-up is already pending or the server is shutting down
+            pass
     
-    def parse_request(self, request_text):
+    def register_parked(self):
         """
-        Parse an HTTP request into its components.
+        Register connections parked by workers with the selector.
+        """
+        try:
+            self.wake_reader.recv(4096)
+        except BlockingIOError:
+            pass
+        
+        while self.parked:
+            self.watch_connection(self.parked.popleft())
+    
+    def watch_connection(self, connection):
+        """
+        Register a connection with the selector and start its idle timer.
+        
+        Args:
+            connection (Connection): Connection waiting for its next request
+        """
+        self.selector.register(connection.sock, selectors.EVENT_READ, connection)
+        connection.wheel_slot = self.wheel_position
+        self.idle_wheel[self.wheel_position].add(connection)
+    
+    def unwatch_connection(self, connection):
+        """
+        Unregister a connection from the selector and stop its idle timer.
         
         Args:
-            request_text (str): Raw HTTP request text
+            connection (Connection): Watched connection
+        """
+        self.selector.unregister(connection.sock)
+        self.idle_wheel[connection.wheel_slot].discard(connection)
+        connection.wheel_slot = None
+    
+    def close_idle_connections(self):
+        """
+        Advance the idle wheel once per elapsed second, closing expired connections.
+        
+        A connection sits in the bucket that was current when it started
+        waiting; the wheel rotates back into that bucket after
+        KEEP_ALIVE_TIMEOUT + 1 ticks, so each tick touches only the
+        connections that are due instead of scanning every watched one.
+        """
+        thread_id = threading.current_thread().name
+        now = time.monotonic()
+        
+        while now - self.wheel_tick >= 1:
+            self.wheel_tick += 1
+            self.wheel_position = (self.wheel_position + 1) % len(self.idle_wheel)
             
-        Returns:
-            tuple: (method, path, version, headers_dict, body) or None if invalid
+            expired = self.idle_wheel[self.wheel_position]
+            self.idle_wheel[self.wheel_position] = set()
+            
+            for connection in expired:
+                self.selector.unregister(connection.sock)
+                self.logger.info("[%s] Connection timeout", thread_id)
+                self.close_connection(connection, thread_id)
+    
+    def close_connection(self, connection, thread_id):
         """
-        try:
-            # Split request into lines
-            lines = request_text.split('\r\n')
+        Close a client connection.
+        
+        Args:
+            connection (Connection): Connection to close
+            thread_id (str): Thread identifier for logging
+        """
+        connection.sock.close()
+        self.logger.info("[%s] Connection closed", thread_id)
+    
+    def worker_loop(self, shard):
+        """
+        Body of a worker thread: serve connections queued on its shard.
+        
+        Args:
+            shard (WorkerShard): Shard this worker belongs to
+        """
+        while True:
+            shard.ready.acquire()
+            connection = shard.connection_queue.popleft()
             
-            # Parse request line
-            request_line = lines[0]
-            parts = request_line.split(' ')
+            # None is the stop signal queued by WorkerShard.stop()
+            if connection is None:
+                return
             
-            if len(parts) != 3:
-                return None
+            with shard.idle_lock:
+                shard.idle_workers -= 1
+            try:
+                self.handle_client(connection)
+            except Exception as e:
+                self.logger.error("[%s] Error in worker: %s", threading.current_thread().name, e)
+            finally:
+                with shard.idle_lock:
+                    shard.idle_workers += 1
+    
+    def handle_client(self, connection):
+        """
+        Serve the requests waiting on a connection, then park or close it.
+        
+        Persistent connections are handed back to the selector loop between
+        requests instead of blocking this worker thread in recv(); so are
+        connections whose request has only partly arrived.
+        
+        Args:
+            connection (Connection): Connection ready to be served
+        """
+        thread_id = threading.current_thread().name
+        keep_open = False
+        
+        try:
+            # Receive request data into this thread's reusable buffer
+            receive_view = self.get_receive_buffer()
+            received = connection.sock.recv_into(receive_view)
             
-            method, path, version = parts
+            if received:
+                pending = connection.pending
+                if not pending:
+                    keep_open = self.serve_requests(connection, receive_view[:received], thread_id)
+                else:
+                    # Continue a request whose start arrived in an earlier
+                    # read by appending to it in place; it is only parsed
+                    # again once the new bytes may have completed it
+                    pending += receive_view[:received]
+                    keep_open = True
+                    if self.pending_complete(connection, pending):
+                        connection.pending = b''
+                        connection.head_scanned = connection.request_length = 0
+                        keep_open = self.serve_requests(connection, memoryview(pending), thread_id)
+                
+        except socket.timeout:
+            self.logger.info("[%s] Connection timeout", thread_id)
+        except Exception as e:
+            self.logger.error("[%s] Error handling request: %s", thread_id, e)
+        
+        if keep_open:
+            self.park_connection(connection)
+        else:
+            self.close_connection(connection, thread_id)
+    
+    def get_receive_buffer(self):
+        """
+        Get the calling thread's receive buffer, allocating it on first use.
+        
+        Each worker reuses one buffer for every recv_into() instead of
+        allocating a new bytes object per request.
+        
+        Returns:
+            memoryview: View over the thread's receive buffer
+        """
+        try:
+            return self.thread_state.receive_view
+        except AttributeError:
+            receive_view = memoryview(bytearray(self.RECV_BUFFER_SIZE))
+            self.thread_state.receive_view = receive_view
+            return receive_view
+    
+    def pending_complete(self, connection, request_data):
+        """
+        Check whether a partial request may be complete after another read.
+        
+        Only the new bytes are searched for the blank line ending the head
+        (from three bytes before where the last search stopped, in case it
+        straddles the reads), and once the head is parsed only the length
+        is compared, so a request trickling in a byte at a time is not
+        rescanned from the start on every read.
+        
+        Args:
+            connection (Connection): Connection holding the partial request
+            request_data (bytearray): Pending data followed by the new bytes
             
-            # Parse headers
-            headers = {}
-            body_start = 0
+        Returns:
+            bool: True if the request should be parsed again, False to keep waiting
+        """
+        if connection.request_length:
+            return len(request_data) >= connection.request_length
+        
+        # An oversized head is left for serve_requests() to reject
+        if len(request_data) >= self.MAX_HEAD_SIZE:
+            return True
+        
+        start = max(connection.head_scanned - 3, 0)
+        if self.HEAD_END_PATTERN.search(request_data, start) is None:
+            connection.head_scanned = len(request_data)
+            return False
+        return True
+    
+    def serve_requests(self, connection, request_data, thread_id):
+        """
+        Handle every complete request in the received data, in order.
+        
+        Pipelined requests are served one after another from the same data
+        and their responses are flushed together in one gathered send; a
+        trailing partial request is kept on the connection until the rest
+        arrives.
+        
+        Args:
+            connection (Connection): Connection the data was read from
+            request_data (memoryview): Unconsumed request data
+            thread_id (str): Thread identifier
             
-            for i, line in enumerate(lines[1:], 1):
-                if line == '':
-                    body_start = i + 1
-                    break
+        Returns:
+            bool: True if the connection should persist, False otherwise
+        """
+        responses = ResponseBuffer(connection.sock, self.send_buffers)
+        
+        try:
+            while request_data:
+                parsed_request = self.parse_request(request_data)
+                
+                if parsed_request is INCOMPLETE_REQUEST:
+                    if len(request_data) >= self.MAX_HEAD_SIZE:
+                        self.logger.warning("[%s] Request head too large", thread_id)
+                        self.send_error(responses, 400, "Bad Request", thread_id)
+                        return False
+                    connection.pending = bytearray(request_data)
+                    connection.head_scanned = len(request_data)
+                    return True
+                
+                # Head parsed but the body is still arriving
+                if parsed_request and parsed_request[4] is None:
+                    connection.pending = bytearray(request_data)
+                    connection.request_length = parsed_request[5]
+                    return True
+                
+                connection.request_count += 1
+                keep_alive = self.handle_request(responses, parsed_request, thread_id)
                 
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    headers[key.strip().lower()] = value.strip()
+                if not keep_alive or connection.request_count >= self.MAX_REQUESTS:
+                    return False
+                
+                request_data = request_data[parsed_request[5]:]
             
-            # Extract body if present
-            body = '\r\n'.join(lines[body_start:]) if body_start > 0 else ''
+            return True
+        finally:
+            responses.flush()
+    
+    def handle_request(self, client_socket, parsed_request, thread_id):
+        """
+        Validate and route a single parsed HTTP request.
+        
+        Args:
+            client_socket (socket or ResponseBuffer): Client socket, or the buffer
+                collecting responses to pipelined requests
+            parsed_request (tuple): Result of parse_request(), None if invalid
+            thread_id (str): Thread identifier
             
-            return method, path, version, headers, body
+        Returns:
+            bool: True if the connection should persist, False otherwise
+        """
+        if not parsed_request:
+            self.send_error(client_socket, 400, "Bad Request", thread_id)
+            return False
+        
+        method, path, version, headers, body, _ = parsed_request
+        
+        self.logger.info("[%s] Request: %s %s %s", thread_id, method, path, version)
+        
+        # Validate Host header
+        if not self.validate_host(headers):
+            if HEADER_HOST not in headers:
+                self.logger.warning("[%s] Missing Host header", thread_id)
+                self.send_error(client_socket, 400, "Bad Request", thread_id)
+            else:
+                self.logger.warning("[%s] Host validation failed: %s", thread_id, headers[HEADER_HOST].decode('latin-1'))
+                self.send_error(client_socket, 403, "Forbidden", thread_id)
+            return False
+        
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("[%s] Host validation: %s ✓", thread_id, headers[HEADER_HOST].decode('latin-1'))
+        
+        # Determine connection persistence
+        keep_alive = self.should_keep_alive(version, headers)
+        
+        # Route request based on method
+        if method == "GET":
+            self.handle_get(client_socket, path, headers, thread_id, keep_alive)
+        elif method == "POST":
+            self.handle_post(client_socket, path, headers, body, thread_id, keep_alive)
+        else:
+            self.send_error(client_socket, 405, "Method Not Allowed", thread_id, keep_alive)
+        
+        # Check if connection should be closed
+        if not keep_alive:
+            self.logger.debug("[%s] Connection: close", thread_id)
+            return False
+        
+        self.logger.debug("[%s] Connection: keep-alive", thread_id)
+        return True
+    
+    def parse_request(self, request_data):
+        """
+        Parse an HTTP request into its components.
+        
+        Works on the raw bytes: the precompiled REQUEST_PATTERN frames the
+        request line and header block, and header lines are split with bytes
+        methods. Only the method, path and version are decoded, while
+        header names, header values and the body are returned as bytes. The
+        body is the Content-Length bytes after the head; anything beyond the
+        request is left for the next one.
+        
+        Args:
+            request_data (bytes or memoryview): Raw HTTP request data
             
-        except Exception:
+        Returns:
+            tuple: (method, path, version, headers_dict, body, request_length),
+                with body None if it has not fully arrived yet;
+                INCOMPLETE_REQUEST if the head is still arriving, or None if invalid
+        """
+        match = self.REQUEST_PATTERN.match(request_data)
+        
+        if not match:
+            # Without the blank line the head may still be arriving
+            if not self.HEAD_END_PATTERN.search(request_data):
+                return INCOMPLETE_REQUEST
             return None
+        
+        method, path, version, header_block = match.group(1, 2, 3, 4)
+        method = method.decode('latin-1')
+        path = path.decode('latin-1')
+        version = version.decode('latin-1')
+        
+        # Parse "Name: value" lines (the block ends with CRLF, so the last
+        # split item is empty), reusing the shared objects for known names.
+        # group(4) copies the header block out of the receive buffer; that
+        # one small copy is cheaper than matching each line in place with
+        # pos/endpos, which took about twice as long per request
+        headers = {}
+        for line in header_block.split(b'\r\n')[:-1]:
+            key, colon, value = line.partition(b':')
+            if not colon:
+                return None
+            key = key.lower()
+            headers[KNOWN_HEADERS.get(key, key)] = value.strip()
+        
+        # Body is the Content-Length bytes after the blank line, copied out
+        # of the (reused) receive buffer only when there is one
+        head_end = match.end()
+        if head_end > self.MAX_HEAD_SIZE:
+            return None
+        
+        content_length = headers.get(HEADER_CONTENT_LENGTH)
+        
+        if content_length is None:
+            request_length = head_end
+            body = b''
+        else:
+            if not content_length.isdigit():
+                return None
+            request_length = head_end + int(content_length)
+            if request_length > self.MAX_REQUEST_SIZE:
+                return None
+            if request_length > len(request_data):
+                return method, path, version, headers, None, request_length
+            body = bytes(request_data[head_end:request_length])
+        
+        return method, path, version, headers, body, request_length
     
     def validate_host(self, headers):
         """
@@ -322,23 +1086,8 @@ class HTTPServer:
         Returns:
             bool: True if valid, False otherwise
         """
-        if 'host' not in headers:
-            return False
-        
-        host_header = headers['host']
-        
-        # Valid host formats
-        valid_hosts = [
-            f"{self.host}:{self.port}",
-            f"localhost:{self.port}",
-            f"127.0.0.1:{self.port}"
-        ]
-        
-        # Also accept without port if using default port 80
-        if self.port == 80:
-            valid_hosts.extend([self.host, "localhost", "127.0.0.1"])
-        
-        return host_header in valid_hosts
+        host_header = headers.get(HEADER_HOST)
+        return host_header is not None and host_header in self.valid_hosts
     
     def should_keep_alive(self, version, headers):
         """
@@ -351,14 +1100,14 @@ class HTTPServer:
         Returns:
             bool: True if connection should persist, False otherwise
         """
-        connection_header = headers.get('connection', '').lower()
+        connection_header = headers.get(HEADER_CONNECTION, b'').lower()
         
         if version == "HTTP/1.1":
             # HTTP/1.1 defaults to keep-alive unless explicitly closed
-            return connection_header != 'close'
+            return connection_header != b'close'
         else:
             # HTTP/1.0 defaults to close unless explicitly keep-alive
-            return connection_header == 'keep-alive'
+            return connection_header == b'keep-alive'
     
     def validate_path(self, path):
         """
@@ -371,42 +1120,32 @@ class HTTPServer:
             str or None: Safe absolute path or None if invalid
         """
         # Remove query string if present
-        path = path.split('?')[0]
+        path = path.partition('?')[0]
         
-        # Check for directory traversal patterns
-        if '..' in path or path.startswith('//'):
+        # Reject traversal patterns and NUL bytes before touching the filesystem
+        if '..' in path or '\x00' in path or path.startswith('//'):
             return None
         
         # Handle root path
         if path == '/' or path == '':
             path = '/index.html'
         
-        # Remove leading slash for file system path
-        if path.startswith('/'):
-            path = path[1:]
-        
-        # Construct full path
-        full_path = os.path.join(self.resources_dir, path)
+        # Canonicalize path (resolving symlinks) under the cached root
+        full_path = os.path.realpath(os.path.join(self.resources_root, path.lstrip('/')))
         
-        # Canonicalize path
-        try:
-            full_path = os.path.abspath(full_path)
-            resources_path = os.path.abspath(self.resources_dir)
-            
-            # Ensure the path is within resources directory
-            if not full_path.startswith(resources_path):
-                return None
-            
-            return full_path
-        except Exception:
+        # Ensure the path is within resources directory (the directory itself,
+        # as in "/.", counts as inside and is answered 404 by the caller)
+        if not (full_path + os.sep).startswith(self.resources_root):
             return None
+        
+        return full_path
     
     def handle_get(self, client_socket, path, headers, thread_id, keep_alive):
         """
         Handle GET requests for serving files.
         
         Args:
-            client_socket (socket): Client socket
+            client_socket (socket or ResponseBuffer): Client socket
             path (str): Requested path
             headers (dict): Request headers
             thread_id (str): Thread identifier
@@ -416,13 +1155,18 @@ class HTTPServer:
         file_path = self.validate_path(path)
         
         if not file_path:
-            self.log(f"Path traversal attempt blocked: {path}", thread_id)
+            self.logger.warning("[%s] Path traversal attempt blocked: %s", thread_id, path)
             self.send_error(client_socket, 403, "Forbidden", thread_id, keep_alive)
             return
         
         # Check if file exists
-        if not os.path.isfile(file_path):
-            self.log(f"File not found: {path}", thread_id)
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            file_stat = None
+        
+        if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
+            self.logger.info("[%s] File not found: %s", thread_id, path)
             self.send_error(client_socket, 404, "Not Found", thread_id, keep_alive)
             return
         
@@ -432,72 +1176,180 @@ class HTTPServer:
         
         # Check if file type is supported
         if ext not in self.CONTENT_TYPES:
-            self.log(f"Unsupported file type: {ext}", thread_id)
+            self.logger.warning("[%s] Unsupported file type: %s", thread_id, ext)
             self.send_error(client_socket, 415, "Unsupported Media Type", thread_id, keep_alive)
             return
         
+        content_type, is_binary = self.CONTENT_TYPES[ext]
+        filename = os.path.basename(file_path)
+        file_size = file_stat.st_size
+        
+        # Prepare per-file response headers (Date is added when sending)
+        response_headers = {
+            'Content-Type': content_type,
+            'Content-Length': str(file_size)
+        }
+        
+        # For binary files, add Content-Disposition header
+        if is_binary:
+            response_headers['Content-Disposition'] = self.content_disposition(filename)
+            self.logger.info("[%s] Sending binary file: %s (%s bytes)", thread_id, filename, file_size)
+        else:
+            self.logger.info("[%s] Serving HTML file: %s (%s bytes)", thread_id, filename, file_size)
+        
+        if file_size <= self.FILE_CACHE_MAX_FILE:
+            # Small files are answered from memory, read again only once
+            # they change on disk
+            entry = self.get_cached_file(file_path, file_stat)
+            
+            if entry is None:
+                try:
+                    with open(file_path, 'rb') as f:
+                        body = f.read()
+                except OSError as e:
+                    self.logger.error("[%s] Error reading file: %s", thread_id, e)
+                    self.send_error(client_socket, 500, "Internal Server Error", thread_id, keep_alive)
+                    return
+                entry = self.cache_file(file_path, file_stat, response_headers, body)
+            
+            head = entry[3] if keep_alive else entry[2]
+            body = entry[4]
+            buffers = [head, f"Date: {self.get_http_date()}\r\n\r\n".encode('ascii'), body]
+            
+            if len(body) <= self.COALESCE_LIMIT:
+                client_socket.sendall(b''.join(buffers))
+            else:
+                self.send_buffers(client_socket, buffers)
+            
+            self.logger.info("[%s] Response: 200 OK (%s bytes transferred)", thread_id, len(body))
+            return
+        
         try:
-            # Read file in binary mode
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
+            # Open file in binary mode; the body is streamed with sendfile()
+            f = open(file_path, 'rb')
+        except OSError as e:
+            self.logger.error("[%s] Error reading file: %s", thread_id, e)
+            self.send_error(client_socket, 500, "Internal Server Error", thread_id, keep_alive)
+            return
+        
+        with f:
+            response_headers['Date'] = self.get_http_date()
             
-            file_size = len(file_data)
-            content_type = self.CONTENT_TYPES[ext]
-            filename = os.path.basename(file_path)
+            # Send headers, then let the kernel copy the file from the page
+            # cache straight to the socket (sendfile(2) on Linux; socket
+            # falls back to buffered sends where it is unavailable)
+            self.send_headers(client_socket, 200, response_headers, keep_alive)
+            client_socket.sendfile(f, 0, file_size)
+            self.logger.info("[%s] Response: 200 OK (%s bytes transferred)", thread_id, file_size)
+    
+    def content_disposition(self, filename):
+        """
+        Build an attachment Content-Disposition value that is pure ASCII.
+        
+        Non-ASCII names (reachable through symlinks inside resources/) are
+        sent percent-encoded in the RFC 6266 filename* parameter, with an
+        ASCII-only fallback name for older clients. Names with quotes,
+        backslashes or control characters take the same route, with those
+        characters replaced by '_' in the fallback.
+        
+        Args:
+            filename (str): File name offered for download
             
-            # Prepare response headers
-            response_headers = {
-                'Content-Type': content_type,
-                'Content-Length': str(file_size),
-                'Date': self.get_http_date(),
-                'Server': 'Multi-threaded HTTP Server',
-                'Connection': 'keep-alive' if keep_alive else 'close'
-            }
+        Returns:
+            str: Content-Disposition header value
+        """
+        fallback = filename.encode('ascii', 'replace').decode('ascii').translate(self.FILENAME_UNSAFE)
+        if fallback == filename:
+            return f'attachment; filename="{filename}"'
+        
+        return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename)}'
+    
+    def get_cached_file(self, file_path, file_stat):
+        """
+        Look up a cached file, ignoring entries older than the file on disk.
+        
+        Args:
+            file_path (str): Resolved file path
+            file_stat (os.stat_result): Current status of the file
             
-            # Add Keep-Alive header if connection persists
-            if keep_alive:
-                response_headers['Keep-Alive'] = 'timeout=30, max=100'
+        Returns:
+            tuple or None: Cache entry, or None on a miss
+        """
+        with self.file_cache_lock:
+            entry = self.file_cache.get(file_path)
+            if entry is None or entry[0] != file_stat.st_mtime_ns or entry[1] != file_stat.st_size:
+                return None
+            self.file_cache.move_to_end(file_path)
+            return entry
+    
+    def cache_file(self, file_path, file_stat, headers, body):
+        """
+        Pre-assemble a file's response and store it in the cache.
+        
+        The response head is rendered for both connection states, without
+        the Date header and the closing blank line, which change per response.
+        Least recently used entries are evicted to stay within FILE_CACHE_SIZE.
+        
+        Args:
+            file_path (str): Resolved file path
+            file_stat (os.stat_result): Status of the file when it was read
+            headers (dict): Per-file response headers
+            body (bytes): File contents
             
-            # For binary files, add Content-Disposition header
-            if content_type == 'application/octet-stream':
-                response_headers['Content-Disposition'] = f'attachment; filename="{filename}"'
-                self.log(f"Sending binary file: {filename} ({file_size} bytes)", thread_id)
-            else:
-                self.log(f"Serving HTML file: {filename} ({file_size} bytes)", thread_id)
+        Returns:
+            tuple: (mtime_ns, size, close_head, keep_alive_head, body)
+        """
+        # The file may have changed between stat() and read()
+        headers['Content-Length'] = str(len(body))
+        
+        entry = (
+            file_stat.st_mtime_ns,
+            file_stat.st_size,
+            self.build_header_block(200, headers, False)[:-2],
+            self.build_header_block(200, headers, True)[:-2],
+            body
+        )
+        entry_size = len(entry[2]) + len(entry[3]) + len(body)
+        
+        with self.file_cache_lock:
+            previous = self.file_cache.pop(file_path, None)
+            if previous is not None:
+                self.file_cache_bytes -= len(previous[2]) + len(previous[3]) + len(previous[4])
             
-            # Send response
-            self.send_response(client_socket, 200, response_headers, file_data)
-            self.log(f"Response: 200 OK ({file_size} bytes transferred)", thread_id)
+            self.file_cache[file_path] = entry
+            self.file_cache_bytes += entry_size
             
-        except Exception as e:
-            self.log(f"Error reading file: {e}", thread_id)
-            self.send_error(client_socket, 500, "Internal Server Error", thread_id, keep_alive)
+            while self.file_cache_bytes > self.FILE_CACHE_SIZE:
+                _, evicted = self.file_cache.popitem(last=False)
+                self.file_cache_bytes -= len(evicted[2]) + len(evicted[3]) + len(evicted[4])
+        
+        return entry
     
     def handle_post(self, client_socket, path, headers, body, thread_id, keep_alive):
         """
         Handle POST requests for JSON data upload.
         
         Args:
-            client_socket (socket): Client socket
+            client_socket (socket or ResponseBuffer): Client socket
             path (str): Requested path
             headers (dict): Request headers
-            body (str): Request body
+            body (bytes): Request body
             thread_id (str): Thread identifier
             keep_alive (bool): Whether to keep connection alive
         """
         # Check Content-Type
-        content_type = headers.get('content-type', '')
+        content_type = headers.get(HEADER_CONTENT_TYPE, b'')
         
-        if 'application/json' not in content_type:
-            self.log(f"Invalid Content-Type for POST: {content_type}", thread_id)
+        if b'application/json' not in content_type:
+            self.logger.warning("[%s] Invalid Content-Type for POST: %s", thread_id, content_type.decode('latin-1'))
             self.send_error(client_socket, 415, "Unsupported Media Type", thread_id, keep_alive)
             return
         
         # Parse and validate JSON
         try:
             json_data = json.loads(body)
-        except json.JSONDecodeError:
-            self.log(f"Invalid JSON in request body", thread_id)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            self.logger.warning("[%s] Invalid JSON in request body", thread_id)
             self.send_error(client_socket, 400, "Bad Request", thread_id, keep_alive)
             return
         
@@ -512,7 +1364,7 @@ class HTTPServer:
             with open(filepath, 'w') as f:
                 json.dump(json_data, f, indent=2)
             
-            self.log(f"Created file: {filename}", thread_id)
+            self.logger.info("[%s] Created file: %s", thread_id, filename)
             
             # Prepare response
             response_data = {
@@ -526,97 +1378,175 @@ class HTTPServer:
             response_headers = {
                 'Content-Type': 'application/json',
                 'Content-Length': str(len(response_body)),
-                'Date': self.get_http_date(),
-                'Server': 'Multi-threaded HTTP Server',
-                'Connection': 'keep-alive' if keep_alive else 'close'
+                'Date': self.get_http_date()
             }
             
-            if keep_alive:
-                response_headers['Keep-Alive'] = 'timeout=30, max=100'
-            
-            self.send_response(client_socket, 201, response_headers, response_body)
-            self.log(f"Response: 201 Created", thread_id)
+            self.send_response(client_socket, 201, response_headers, response_body, keep_alive)
+            self.logger.info("[%s] Response: 201 Created", thread_id)
             
         except Exception as e:
-            self.log(f"Error saving file: {e}", thread_id)
+            self.logger.error("[%s] Error saving file: %s", thread_id, e)
             self.send_error(client_socket, 500, "Internal Server Error", thread_id, keep_alive)
     
-    def send_response(self, client_socket, status_code, headers, body):
+    def build_header_block(self, status_code, headers, keep_alive):
         """
-        Send an HTTP response to the client.
+        Build the status line and headers of an HTTP response.
+        
+        Only the per-response headers are formatted; the Server and
+        Connection lines are appended from pre-encoded constants.
         
         Args:
-            client_socket (socket): Client socket
             status_code (int): HTTP status code
-            headers (dict): Response headers
-            body (bytes or str): Response body
+            headers (dict): Per-response headers; values may be str or int
+            keep_alive (bool): Whether the connection stays open
+            
+        Returns:
+            bytes: Status line and headers, terminated by a blank line
+        """
+        # Look up the pre-encoded status line
+        status_line = self.STATUS_LINES.get(status_code)
+        if status_line is None:
+            status_line = f"HTTP/1.1 {status_code} Unknown\r\n".encode('ascii')
+        
+        # Encode each header line straight to bytes (header values are ASCII
+        # by construction, see content_disposition()) and join everything
+        # with the status line in a single allocation
+        header_lines = b''.join([f"{key}: {value}\r\n".encode('ascii') for key, value in headers.items()])
+        return b''.join((
+            status_line,
+            header_lines,
+            self.SERVER_HEADER,
+            self.KEEP_ALIVE_HEADERS if keep_alive else self.CLOSE_HEADERS,
+            b'\r\n'
+        ))
+    
+    def send_headers(self, client_socket, status_code, headers, keep_alive):
         """
-        # Build status line
-        status_text = self.STATUS_CODES.get(status_code, "Unknown")
-        status_line = f"HTTP/1.1 {status_code} {status_text}\r\n"
+        Send the status line and headers of an HTTP response.
+        
+        The body is written separately by the caller.
         
-        # Build headers
-        header_lines = []
-        for key, value in headers.items():
-            header_lines.append(f"{key}: {value}\r\n")
+        Args:
+            client_socket (socket or ResponseBuffer): Client socket
+            status_code (int): HTTP status code
+            headers (dict): Per-response headers
+            keep_alive (bool): Whether the connection stays open
+        """
+        client_socket.sendall(self.build_header_block(status_code, headers, keep_alive))
+    
+    def send_response(self, client_socket, status_code, headers, body, keep_alive):
+        """
+        Send an HTTP response to the client.
         
-        # Combine status line, headers, and body
-        response = status_line.encode('utf-8')
-        response += ''.join(header_lines).encode('utf-8')
-        response += b'\r\n'
+        Args:
+            client_socket (socket or ResponseBuffer): Client socket
+            status_code (int): HTTP status code
+            headers (dict): Per-response headers
+            body (bytes or str): Response body
+            keep_alive (bool): Whether the connection stays open
+        """
+        header_block = self.build_header_block(status_code, headers, keep_alive)
         
-        # Add body
         if isinstance(body, str):
-            response += body.encode('utf-8')
+            body = body.encode('utf-8')
+        
+        # Small responses are cheapest as one contiguous sendall(); larger
+        # bodies are gathered with the headers instead of being copied
+        if len(body) <= self.COALESCE_LIMIT:
+            client_socket.sendall(b''.join((header_block, body)))
         else:
-            response += body
+            self.send_buffers(client_socket, [header_block, body])
+    
+    def send_buffers(self, client_socket, buffers):
+        """
+        Write several buffers to the socket with gathered writes.
+        
+        Uses sendmsg() (writev-style scatter/gather) so the buffers go out in
+        one system call without being copied into a single bytes object,
+        retrying on partial writes until everything is sent.
         
-        # Send response
-        client_socket.sendall(response)
+        Args:
+            client_socket (socket or ResponseBuffer): Client socket
+            buffers (list): bytes-like objects to send in order
+        """
+        if not hasattr(client_socket, 'sendmsg'):
+            client_socket.sendall(b''.join(buffers))
+            return
+        
+        pending = [memoryview(buffer) for buffer in buffers if len(buffer)]
+        
+        while pending:
+            sent = client_socket.sendmsg(pending[:self.SENDMSG_MAX_BUFFERS])
+            
+            # Drop fully written buffers and trim a partially written one
+            while pending and sent >= len(pending[0]):
+                sent -= len(pending[0])
+                pending.pop(0)
+            if sent:
+                pending[0] = pending[0][sent:]
+    
+    def send_buffers_once(self, client_socket, buffers):
+        """
+        Write several buffers to a non-blocking socket with a single send.
+        
+        Whatever does not fit in the socket buffer is dropped rather than
+        retried, so the caller never waits on the client.
+        
+        Args:
+            client_socket (socket): Non-blocking client socket
+            buffers (list): bytes-like objects to send in order
+        """
+        if hasattr(client_socket, 'sendmsg'):
+            client_socket.sendmsg(buffers)
+        else:
+            client_socket.send(b''.join(buffers))
     
     def send_error(self, client_socket, status_code, message, thread_id, keep_alive=False):
         """
         Send an HTTP error response.
         
         Args:
-            client_socket (socket): Client socket
+            client_socket (socket or ResponseBuffer): Client socket
             status_code (int): HTTP status code
             message (str): Error message
             thread_id (str): Thread identifier
             keep_alive (bool): Whether to keep connection alive
         """
-        error_body = f"""<!DOCTYPE html>
-<html>
-<head><title>{status_code} {message}</title></head>
-<body>
-<h1>{status_code} {message}</h1>
-<p>The server encountered an error processing your request.</p>
-</body>
-</html>"""
+        error_body = self.ERROR_BODIES.get(status_code)
+        if error_body is None or message != self.STATUS_CODES[status_code]:
+            error_body = error_page(status_code, message)
+            content_length = str(len(error_body))
+        else:
+            content_length = self.ERROR_LENGTHS[status_code]
         
         headers = {
             'Content-Type': 'text/html; charset=utf-8',
-            'Content-Length': str(len(error_body)),
-            'Date': self.get_http_date(),
-            'Server': 'Multi-threaded HTTP Server',
-            'Connection': 'keep-alive' if keep_alive else 'close'
+            'Content-Length': content_length,
+            'Date': self.get_http_date()
         }
         
         if status_code == 503:
             headers['Retry-After'] = '10'
         
-        self.send_response(client_socket, status_code, headers, error_body)
-        self.log(f"Response: {status_code} {message}", thread_id)
+        self.send_response(client_socket, status_code, headers, error_body, keep_alive)
+        self.logger.info("[%s] Response: %s %s", thread_id, status_code, message)
     
     def get_http_date(self):
         """
         Get current date in RFC 7231 format for HTTP headers.
         
+        The value has one-second resolution, so it is reformatted at most
+        once per second.
+        
         Returns:
             str: Formatted date string
         """
-        from email.utils import formatdate
-        return formatdate(timeval=None, localtime=False, usegmt=True)
+        now = int(time.time())
+        second, date = self.http_date
+        if second != now:
+            date = formatdate(timeval=now, localtime=False, usegmt=True)
+            self.http_date = (now, date)
+        return date
 
 
 def main():
@@ -628,6 +1558,7 @@ def main():
     host = "127.0.0.1"
     port = 8080
     max_threads = 10
+    processes = 1
     
     # Parse command-line arguments
     if len(sys.argv) > 1:
@@ -647,8 +1578,15 @@ def main():
             print("Error: Max threads must be an integer")
             sys.exit(1)
     
+    if len(sys.argv) > 4:
+        try:
+            processes = int(sys.argv[4])
+        except ValueError:
+            print("Error: Processes must be an integer")
+            sys.exit(1)
+    
     # Create and start server
-    server = HTTPServer(host=host, port=port, max_threads=max_threads)
+    server = HTTPServer(host=host, port=port, max_threads=max_threads, processes=processes)
     server.start()
 
 